@@ -1,4 +1,5 @@
 import socket
+from collections import namedtuple
 from queue import Queue
 import selectors
 import threading
@@ -15,38 +16,80 @@ class TichuError(Exception):
     pass
 
 
+class GameState(
+    namedtuple(
+        "GameState",
+        ["version", "hand", "hand_ids", "stage", "stage_ids", "table", "turn", "players"],
+    )
+):
+    """immutable snapshot of the game as seen by this client
+
+    hand, stage and table are tuples of card names, hand_ids and stage_ids hold the
+    original indices of the cards in hand and stage (the server needs them to identify
+    played cards). players contains (name, status) pairs of the other players.
+    every change to the game produces a new snapshot with a higher version
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        return cls(0, (), (), (), (), (), False, ())
+
+
+def _split(cards):
+    """split a list of (index, card) pairs into a tuple of indices and a tuple of cards
+    """
+    ids = tuple(i for i, _ in cards)
+    names = tuple(c for _, c in cards)
+    return ids, names
+
+
 class Client:
     def __init__(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.connected = False
-        self._hand = [] # the player's cards
-        self._stage = [] # cards that the player is about to play
-        self.turn = False # is it my turn?
+        # the current snapshot of the game; it is only ever replaced as a whole so reading
+        # it needs no lock. writers (gui and listener thread) must hold _state_lock
+        self._state = GameState.empty()
+        self._state_lock = threading.Lock()
         self.push_msgs = Queue()
         self.response_msgs = Queue()
 
+    @property
+    def state(self):
+        return self._state
+
     @property
     def hand(self):
-        return self._hand
+        return self._state.hand
 
     @hand.setter
     def hand(self, h):
         # save the original indices
-        self._hand = list(enumerate(h))
-
-    @hand.getter
-    def hand(self):
-        # the original indices are noone's business
-        return [c for _, c in self._hand]
+        ids, names = _split(list(enumerate(h)))
+        with self._state_lock:
+            self._update(hand=names, hand_ids=ids)
 
     @property
     def stage(self):
-        return self._stage
+        return self._state.stage
 
-    @stage.getter
-    def stage(self):
-        # same as above
-        return [c for _, c in self._stage]
+    @property
+    def turn(self):
+        return self._state.turn
+
+    @turn.setter
+    def turn(self, t):
+        with self._state_lock:
+            self._update(turn=t)
+
+    def _update(self, **changes):
+        """replace the current snapshot by a new one with the given changes
+        must be called with _state_lock held
+        """
+        state = self._state
+        self._state = state._replace(version=state.version + 1, **changes)
 
     def connect(self, username, ip="127.0.0.1", port=1001):
         self.remote_addr = (ip, port)
@@ -103,6 +146,11 @@ class Client:
                             topic, msg = msg.split(":", 1)
                             if topic == "newtrick":
                                 msg = msg.lower().split(",")[:-1]
+                                with self._state_lock:
+                                    self._update(table=tuple(msg))
+                            elif topic == "cleartable":
+                                with self._state_lock:
+                                    self._update(table=())
                             elif topic == "yourturn":
                                 self.turn = True
                                 continue
@@ -135,40 +183,59 @@ class Client:
         elif status == "err":
             raise TichuError(message)
 
-    def stage_card(self, i, j):
+    def _move_card(self, source, i, target, j, hand_ids, stage_ids):
+        """move card i from source to j in target (source and target are "hand" or "stage")
+        hand_ids and stage_ids are the ids of the cards the caller saw when choosing i and j;
+        if the cards have changed in the meantime, the move is ignored
+        """
+        with self._state_lock:
+            state = self._state
+            if hand_ids != state.hand_ids or stage_ids != state.stage_ids:
+                logger.debug("cards changed in the meantime, ignoring move")
+                return
+            cards = {
+                "hand": list(zip(state.hand_ids, state.hand)),
+                "stage": list(zip(state.stage_ids, state.stage)),
+            }
+            cards[target].insert(j, cards[source].pop(i))
+            hand_ids, hand = _split(cards["hand"])
+            stage_ids, stage = _split(cards["stage"])
+            self._update(hand=hand, hand_ids=hand_ids, stage=stage, stage_ids=stage_ids)
+
+    def stage_card(self, i, j, hand_ids, stage_ids):
         """move card i from hand to j in stage
         """
-        self._stage.insert(j, self._hand.pop(i))
+        self._move_card("hand", i, "stage", j, hand_ids, stage_ids)
 
-    def unstage_card(self, i, j):
+    def unstage_card(self, i, j, hand_ids, stage_ids):
         """reverse action to stage
         """
-        self._hand.insert(j, self._stage.pop(i))
+        self._move_card("stage", i, "hand", j, hand_ids, stage_ids)
 
-    def move_hand(self, i, j):
+    def move_hand(self, i, j, hand_ids, stage_ids):
         """move card i in hand to j
         """
-        self._hand.insert(j, self._hand.pop(i))
+        self._move_card("hand", i, "hand", j, hand_ids, stage_ids)
 
-    def move_stage(self, i, j):
+    def move_stage(self, i, j, hand_ids, stage_ids):
         """move card i in stage to j
         """
-        self._stage.insert(j, self._stage.pop(i))
+        self._move_card("stage", i, "stage", j, hand_ids, stage_ids)
 
     def delete_cards(self):
         """deletes all cards (after finished round)
         """
-        self._stage = []
-        self._hand = []
+        with self._state_lock:
+            self._update(hand=(), hand_ids=(), stage=(), stage_ids=())
 
     def play(self):
         """submit the current stage to the table
         """
-        indices = [i for i, _ in self._stage]
+        indices = self._state.stage_ids
         status, message = self._send_and_recv("play {}".format(" ".join(map(str, indices))))
         if status == "ok":
-            self._stage = []
-            self.turn = False
+            with self._state_lock:
+                self._update(stage=(), stage_ids=(), turn=False)
         else:
             raise TichuError(message)
 
@@ -189,6 +256,6 @@ if __name__ == "__main__":
     client.connect(args.user)
     client.deal()
     client.request_cards()
-    print(client._hand)
+    print(client.hand)
     client.stage(0, 0)
     client.play()
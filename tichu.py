@@ -3,7 +3,7 @@ from pygame.color import THECOLORS as COLORS
 import threading
 import random
 import os
-from functools import wraps
+from functools import wraps, lru_cache
 from client import Client, TichuError
 
 import logging
@@ -11,13 +11,22 @@ import logging
 logger = logging.getLogger("tichu")
 
 
+# reference size of the window, all other sizes are given relative to it (scale factor 1)
 WIDTH, HEIGHT = 1300, 800
+# the window opens with the aspect ratio of WIDTH:HEIGHT and at most this fraction of the desktop
+SCREEN_FRACTION = 0.8
 FRAMERATE = 30
 pg.font.init()
-FONT = pg.font.Font(None, 32)
-FONT_SMALL = pg.font.Font(None, 18)
+FONT_SIZE = 32
+FONT_SMALL_SIZE = 18
 CARD_WIDTH = 60
 CARD_HEIGHT = 90
+# scale factors are rounded to multiples of this so that resizing the window does not
+# create new fonts and card faces for every single pixel
+SCALE_STEP = 0.05
+# maximum number of cached fonts and card faces (a full deck has 56 cards)
+FONT_CACHE_SIZE = 8
+CARD_CACHE_SIZE = 2 * 56
 
 C_BACKGROUND = COLORS["white"]
 C_BUTTON = COLORS["darkseagreen1"]
@@ -46,13 +55,73 @@ SYMBOL_MAP = {
 }
 
 
+def scale_factor(size):
+    """scale factor of all widgets for a window of the given size
+    """
+    factor = min(size[0] / WIDTH, size[1] / HEIGHT)
+    return max(SCALE_STEP, round(round(factor / SCALE_STEP) * SCALE_STEP, 2))
+
+
+def scaled(value, scale):
+    return round(value * scale)
+
+
+def initial_size():
+    """size of the window on start, must be called before the window is created
+    """
+    info = pg.display.Info()
+    if info.current_w <= 0 or info.current_h <= 0:
+        # the desktop size is unknown
+        return WIDTH, HEIGHT
+    factor = SCREEN_FRACTION * min(info.current_w / WIDTH, info.current_h / HEIGHT)
+    return scaled(WIDTH, factor), scaled(HEIGHT, factor)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(size, scale):
+    return pg.font.Font(None, max(1, scaled(size, scale)))
+
+
+@lru_cache(maxsize=None)
+def load_symbol(name):
+    return pg.image.load(os.path.join(RESOURCES_PATH, name + ".png"))
+
+
+@lru_cache(maxsize=CARD_CACHE_SIZE)
+def card_face(name, scale):
+    """render the face of a card, this happens only once per card and scale factor
+    """
+    face = pg.Surface((scaled(CARD_WIDTH, scale), scaled(CARD_HEIGHT, scale)))
+    face.fill(COLORS["white"])  # draw background
+    pg.draw.rect(face, C_TEXT, face.get_rect(), max(1, scaled(2, scale)))  # draw border
+    # special cards don't have a space in their name
+    if " " in name:
+        color, value = name.split()
+        symbol = load_symbol(color)
+    else:
+        symbol = load_symbol(name)
+    symbol = pg.transform.smoothscale(
+        symbol,
+        (scaled(symbol.get_width(), scale), scaled(symbol.get_height(), scale)),
+    )
+    face.blit(symbol, (scaled(-20, scale), scaled(5, scale)))
+    if " " in name:
+        face.blit(
+            get_font(FONT_SIZE, scale).render(SYMBOL_MAP[value.lower()], True, COLORS[color]),
+            (scaled(CARD_WIDTH - 25, scale), scaled(5, scale)),
+        )
+    return face
+
+
 class TextInputBox:
     # mostly copied from https://stackoverflow.com/questions/46390231/how-to-create-a-text-input-box-with-pygame
-    def __init__(self, x, y, width, height, text=""):
+    def __init__(self, x, y, width, height, text="", scale=1):
         self.rectangle = pg.Rect(x, y, width, height)
         self.text = text
         self.active = False
-        self.rendered = FONT.render(self.text, True, C_TEXT)
+        self.scale = scale
+        self.font = get_font(FONT_SIZE, scale)
+        self.rendered = self.font.render(self.text, True, C_TEXT)
 
     def update(self, event):
         if event.type == pg.MOUSEBUTTONDOWN:
@@ -72,20 +141,24 @@ class TextInputBox:
                     self.text += event.unicode
 
         # Re-render the text.
-        self.rendered = FONT.render(self.text, True, C_TEXT)
+        self.rendered = self.font.render(self.text, True, C_TEXT)
 
     def draw(self, screen):
         pg.draw.rect(screen, C_TEXTBOX_INACTIVE, self.rectangle, 0)
         if self.active:
             # draw border
-            pg.draw.rect(screen, C_TEXTBOX_ACTIVE, self.rectangle, 2)
-        screen.blit(self.rendered, (self.rectangle.x + 5, self.rectangle.y + 10))
+            pg.draw.rect(screen, C_TEXTBOX_ACTIVE, self.rectangle, max(1, scaled(2, self.scale)))
+        screen.blit(
+            self.rendered,
+            (self.rectangle.x + scaled(5, self.scale), self.rectangle.y + scaled(10, self.scale)),
+        )
 
 
 class Button(pg.Rect):
-    def __init__(self, x, y, width, height, text="", on_click=None):
+    def __init__(self, x, y, width, height, text="", on_click=None, scale=1):
         pg.Rect.__init__(self, x, y, width, height)
         self.text = text
+        self.scale = scale
         self.on_click = on_click
         self.pressed = False
         self.enabled = True
@@ -110,46 +183,32 @@ class Button(pg.Rect):
             color = C_BUTTON
 
         pg.draw.rect(screen, color, self, 0)
-        text = FONT.render(self.text, True, C_TEXT)
+        text = get_font(FONT_SIZE, self.scale).render(self.text, True, C_TEXT)
         screen.blit(
             text,
             (
                 self.x + self.w / 2 - text.get_width() / 2,
-                self.y + 10,
+                self.y + scaled(10, self.scale),
             ),
         )
 
 
 class Card(pg.Rect):
-    def __init__(self, x, y, name):
+    def __init__(self, x, y, name, scale=1):
         # save original coordinates as the current coordinates may change via drag and drop
         self.x0 = x
         self.y0 = y
-        pg.Rect.__init__(self, x, y, CARD_WIDTH, CARD_HEIGHT)
-        # special cards don't have a space in their name
-        if " " in name:
-            self.color, value = name.split()
-            self.symbol = pg.image.load(
-                os.path.join(RESOURCES_PATH, self.color + ".png")
-            )
-            self.text = SYMBOL_MAP[value.lower()]
-        else:
-            self.symbol = pg.image.load(os.path.join(RESOURCES_PATH, name + ".png"))
+        pg.Rect.__init__(self, x, y, scaled(CARD_WIDTH, scale), scaled(CARD_HEIGHT, scale))
+        self.face = card_face(name, scale)
 
     def draw(self, screen):
-        pg.draw.rect(screen, COLORS["white"], self, 0)  # draw background
-        pg.draw.rect(screen, C_TEXT, self, 2)  # draw border of rectangle
-        screen.blit(self.symbol, (self.x - 20, self.y + 5))
-        if hasattr(self, "text"):
-            screen.blit(
-                FONT.render(self.text, True, COLORS[self.color]),
-                (self.x + CARD_WIDTH - 25, self.y + 5),
-            )
+        screen.blit(self.face, self)
 
 
 class Hand(pg.Rect):
-    def __init__(self, x, y, width, height):
+    def __init__(self, x, y, width, height, scale=1):
         pg.Rect.__init__(self, x, y, width, height)
+        self.scale = scale
         self.cardbuttons = []
 
     def set_cards(self, cardnames):
@@ -158,17 +217,18 @@ class Hand(pg.Rect):
             return
 
         # calculate the space the cards will need
-        space = 20  # space between 2 cards
-        needed_width = CARD_WIDTH * len(cardnames) + space * (len(cardnames) - 1)
+        space = scaled(20, self.scale)  # space between 2 cards
+        card_width = scaled(CARD_WIDTH, self.scale)
+        needed_width = card_width * len(cardnames) + space * (len(cardnames) - 1)
         # x coordinate of first card
         x0 = self.x + int(self.width / 2) - int(needed_width / 2)
-        y0 = self.y + 20
+        y0 = self.y + scaled(20, self.scale)
         for i, card in enumerate(cardnames):
-            x = x0 + i * (CARD_WIDTH + space)
-            self.cardbuttons.append(Card(x, y0, card))
+            x = x0 + i * (card_width + space)
+            self.cardbuttons.append(Card(x, y0, card, self.scale))
 
     def draw(self, screen):
-        pg.draw.rect(screen, C_TEXT, self, 3)
+        pg.draw.rect(screen, C_TEXT, self, max(1, scaled(3, self.scale)))
         for card in self.cardbuttons:
             card.draw(screen)
 
@@ -177,12 +237,17 @@ class CardArea:
     """displays the player's cards and stage + handles drag & drop of cards
     """
 
-    def __init__(self, x, y, width, height, callbackobject):
-        self.hand = Hand(x, y, width, height / 2 - 10)
-        self.stage = Hand(x, y - height / 2 - 20, width, height / 2 - 10)
+    def __init__(self, x, y, width, height, callbackobject, scale=1):
+        self.hand = Hand(x, y, width, height / 2 - scaled(10, scale), scale)
+        self.stage = Hand(
+            x, y - height / 2 - scaled(20, scale), width, height / 2 - scaled(10, scale), scale
+        )
         # this will contain a triple of the card being dragged, its index and either "hand" or "stage"
         # depending on where the card is from
         self.dragged_card = None
+        # ids of the displayed cards in hand and stage, the client uses them to check that
+        # a move refers to the cards that are currently displayed
+        self.card_ids = ((), ())
         self.callbackmatrix = {
             "hand": {"hand": callbackobject.move_hand, "stage": callbackobject.stage_card},
             "stage": {"hand": callbackobject.unstage_card, "stage": callbackobject.move_stage},
@@ -274,18 +339,16 @@ class CardArea:
                 card.x, card.y = card.x0, card.y0
                 return
 
-            # call the callback
-            self.callbackmatrix[sourcename][targetname](i, j)
-            # update hand and stage
-            self.set_hand(self.callbackobject.hand)
-            self.set_stage(self.callbackobject.stage)
+            # call the callback; hand and stage get updated with the next game state
+            self.callbackmatrix[sourcename][targetname](i, j, *self.card_ids)
 
 
-def table(cardnames):
-    x0, y0 = WIDTH / 2 - 60, 200
+def table(cardnames, width, scale=1):
+    x0, y0 = width / 2 - scaled(60, scale), scaled(200, scale)
     cards = []
     for i, card in enumerate(cardnames):
-        cards.append(Card(x0 + i * 30, y0 + random.random() * 10 - 5, card))
+        y = y0 + scaled(random.random() * 10 - 5, scale)
+        cards.append(Card(x0 + i * scaled(30, scale), y, card, scale))
     return list(reversed(cards))
 
 
@@ -301,11 +364,19 @@ class TichuGui:
         self.error = None  # will contain error messages from server
 
         pg.init()
-        self.screen = pg.display.set_mode((WIDTH, HEIGHT))
+        pg.display.set_mode(initial_size(), pg.RESIZABLE)
+        self.resize()
         pg.display.set_caption("Online-Tichu")
         pg.mouse.set_visible(1)
         self.clock = pg.time.Clock()
 
+    def resize(self):
+        """update size and scale factor after the (resizable) window changed its size
+        """
+        self.screen = pg.display.get_surface()
+        self.width, self.height = self.screen.get_size()
+        self.scale = scale_factor((self.width, self.height))
+
     def catch_server_error(self, f):
         """wrapper function for button callbacks
         """
@@ -319,43 +390,63 @@ class TichuGui:
                 def on_ok():
                     self.error = None
                     self.buttons.pop("error")
-                self.buttons["error"] = Button(0, 0, 100, 40, "OK", on_click=on_ok)
+                self.buttons["error"] = Button(0, 0, 100, 40, "OK", on_click=on_ok, scale=self.scale)
 
         return callback
 
     def draw_error_window(self):
-        x, y = WIDTH / 2 - 150, HEIGHT / 2 - 50
-        background = pg.Rect(x, y, 300, 110)
+        s = self.scale
+        x, y = self.width / 2 - scaled(150, s), self.height / 2 - scaled(50, s)
+        background = pg.Rect(x, y, scaled(300, s), scaled(110, s))
         pg.draw.rect(self.screen, COLORS["red"], background, 0)
-        pg.draw.rect(self.screen, C_TEXT, background, 2)
-        self.screen.blit(FONT.render("Error", True, C_TEXT), (x + 5, y + 5))
-        self.screen.blit(FONT_SMALL.render(self.error, True, C_TEXT), (x + 5, y + 40))
-        # move the error button to this "window"
-        self.buttons["error"].x = x + 100
-        self.buttons["error"].y = y + 60
+        pg.draw.rect(self.screen, C_TEXT, background, max(1, scaled(2, s)))
+        self.screen.blit(
+            get_font(FONT_SIZE, s).render("Error", True, C_TEXT),
+            (x + scaled(5, s), y + scaled(5, s)),
+        )
+        self.screen.blit(
+            get_font(FONT_SMALL_SIZE, s).render(self.error, True, C_TEXT),
+            (x + scaled(5, s), y + scaled(40, s)),
+        )
+        # move the error button to this "window" (the window may have been resized)
+        button = self.buttons["error"]
+        button.x, button.y = x + scaled(100, s), y + scaled(60, s)
+        button.size = (scaled(100, s), scaled(40, s))
+        button.scale = s
 
     def login_screen(self):
         logged_in = False
-        username_box = TextInputBox(
-            WIDTH / 2 - 150, HEIGHT / 2 - 75, 300, 40, "username"
-        )
-        addr_box = TextInputBox(
-            WIDTH / 2 - 150, HEIGHT / 2 - 20, 300, 40, "127.0.0.1:1001"
-        )
-        go_button = Button(
-            WIDTH / 2 - 150,
-            HEIGHT / 2 + 30,
-            300,
-            40,
-            "Go!",
-            on_click=lambda: (username_box.text, addr_box.text),
-        )
+
+        def layout(username, addr):
+            s = self.scale
+            x = self.width / 2 - scaled(150, s)
+            username_box = TextInputBox(
+                x, self.height / 2 - scaled(75, s), scaled(300, s), scaled(40, s), username, s
+            )
+            addr_box = TextInputBox(
+                x, self.height / 2 - scaled(20, s), scaled(300, s), scaled(40, s), addr, s
+            )
+            go_button = Button(
+                x,
+                self.height / 2 + scaled(30, s),
+                scaled(300, s),
+                scaled(40, s),
+                "Go!",
+                on_click=lambda: (username_box.text, addr_box.text),
+                scale=s,
+            )
+            return username_box, addr_box, go_button
+
+        username_box, addr_box, go_button = layout("username", "127.0.0.1:1001")
         while not logged_in and self.running:
             self.clock.tick(FRAMERATE)
             self.screen.fill(C_BACKGROUND)
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     self.running = False
+                elif event.type == pg.VIDEORESIZE:
+                    self.resize()
+                    username_box, addr_box, go_button = layout(username_box.text, addr_box.text)
                 else:
                     username_box.update(event)
                     addr_box.update(event)
@@ -382,7 +473,8 @@ class TichuGui:
             pg.display.flip()
 
     def wait_screen(self):
-        text = FONT.render("wait for the others to connect ...", True, C_TEXT)
+        message = "wait for the others to connect ..."
+        text = get_font(FONT_SIZE, self.scale).render(message, True, C_TEXT)
         while self.running and not self.on_main:
             # self.on_main gets set to true as soon as the thread started in login_screen
             # is finished
@@ -390,9 +482,18 @@ class TichuGui:
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     self.running = False
+                elif event.type == pg.VIDEORESIZE:
+                    self.resize()
+                    text = get_font(FONT_SIZE, self.scale).render(message, True, C_TEXT)
 
             self.screen.fill(C_BACKGROUND)
-            self.screen.blit(text, (WIDTH / 2 - text.get_width() / 2, HEIGHT / 2 - 20))
+            self.screen.blit(
+                text,
+                (
+                    self.width / 2 - text.get_width() / 2,
+                    self.height / 2 - scaled(20, self.scale),
+                ),
+            )
             pg.display.flip()
 
         if self.running:
@@ -401,42 +502,60 @@ class TichuGui:
 
     def main_screen(self):
 
-        card_area = CardArea(
-            50,
-            HEIGHT - CARD_HEIGHT - 80,
-            WIDTH - 100, 2 * (CARD_HEIGHT + 40) + 20,
-            callbackobject=self.client
-        )
-
         # callback function for take_hand_button
         @self.catch_server_error
         def take_hand():
             self.client.request_cards()
-            card_area.set_hand(self.client.hand)
-        # TODO: on_click: disable this button + error handling
-        self.buttons["take"] = Button(50, 50, 180, 40, "take new cards", on_click=take_hand)
 
-        # callback function for play_button
-        @self.catch_server_error
-        def play():
-            self.client.play()
-            card_area.set_stage(self.client.stage)
-        self.buttons["play"] = Button(card_area.stage.x + card_area.stage.width - 180, card_area.stage.y - 20, 150, 40, "play", on_click=play)
-        self.buttons["pass"] = Button(card_area.stage.x + card_area.stage.width - 380, card_area.stage.y - 20, 150, 40, "pass", on_click=self.catch_server_error(self.client.pass_play))
+        def layout():
+            s = self.scale
+            card_area = CardArea(
+                scaled(50, s),
+                self.height - scaled(CARD_HEIGHT + 80, s),
+                self.width - scaled(100, s), scaled(2 * (CARD_HEIGHT + 40) + 20, s),
+                callbackobject=self.client,
+                scale=s,
+            )
+            # TODO: on_click: disable this button + error handling
+            self.buttons["take"] = Button(scaled(50, s), scaled(50, s), scaled(180, s), scaled(40, s), "take new cards", on_click=take_hand, scale=s)
+            stage = card_area.stage
+            self.buttons["play"] = Button(stage.x + stage.width - scaled(180, s), stage.y - scaled(20, s), scaled(150, s), scaled(40, s), "play", on_click=self.catch_server_error(self.client.play), scale=s)
+            self.buttons["pass"] = Button(stage.x + stage.width - scaled(380, s), stage.y - scaled(20, s), scaled(150, s), scaled(40, s), "pass", on_click=self.catch_server_error(self.client.pass_play), scale=s)
+            # check if it's the player's turn
+            turn = self.client.state.turn
+            self.buttons["play"].enabled = turn
+            self.buttons["pass"].enabled = turn
+            return card_area
 
+        card_area = layout()
+        state = None  # the game state that is currently displayed
         while self.running:
             self.clock.tick(FRAMERATE)
-            # check if it's the player's turn
-            if self.client.turn:
-                self.buttons["play"].enabled = True
-                self.buttons["pass"].enabled = True
-            else:
-                self.buttons["play"].enabled = False
-                self.buttons["pass"].enabled = False
+            # get the newest game state and only rebuild the widgets if it changed
+            newstate = self.client.state
+            if state is None or newstate.version != state.version:
+                cards = (newstate.hand, newstate.hand_ids, newstate.stage, newstate.stage_ids)
+                if state is None or cards != (state.hand, state.hand_ids, state.stage, state.stage_ids):
+                    card_area.set_hand(newstate.hand)
+                    card_area.set_stage(newstate.stage)
+                    card_area.card_ids = (newstate.hand_ids, newstate.stage_ids)
+                    # a dragged card belongs to the old cards, drop it
+                    card_area.dragged_card = None
+                if state is None or newstate.table != state.table:
+                    self.table_cards = table(newstate.table, self.width, self.scale)
+                # check if it's the player's turn
+                self.buttons["play"].enabled = newstate.turn
+                self.buttons["pass"].enabled = newstate.turn
+                state = newstate
 
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     self.running = False
+                elif event.type == pg.VIDEORESIZE:
+                    self.resize()
+                    card_area = layout()
+                    # forget the displayed state so that all widgets get rebuilt
+                    state = None
                 else:
                     card_area.handle_event(event)
                     for button in list(self.buttons.values()):
@@ -444,14 +563,10 @@ class TichuGui:
 
             self.screen.fill(C_BACKGROUND)
 
-            # check if there are new cards on the table that we should display
+            # changes of the game are already contained in the game state
             if self.client.has_push_msgs():
                 topic, msg = self.client.get_newest_push()
                 logger.debug("got a push msg: {}, {}".format(topic, msg))
-                if topic == "newtrick":
-                    self.table_cards = table(msg)
-                elif topic == "cleartable":
-                    self.table_cards = []
 
             # draw cards on the table
             for card in self.table_cards: